@@ -1,14 +1,20 @@
+import json
 import os
+import time
 import urllib.parse  # For encoding credentials
 from datetime import datetime, timedelta, timezone  # Added timedelta, timezone
 
 from bson import ObjectId
 from dateutil.relativedelta import relativedelta  # Added relativedelta
-from flask import (Flask, flash, jsonify, redirect, render_template, request,
-                   url_for)
-from pymongo import MongoClient, errors
+from flask import (Flask, Response, flash, jsonify, redirect, render_template,
+                   request, url_for)
+from pymongo import ASCENDING, MongoClient, ReturnDocument, UpdateOne, errors
+from pymongo.read_preferences import (Nearest, Primary, PrimaryPreferred,
+                                      Secondary, SecondaryPreferred)
 
 import config  # Import config variables
+from menu_search import MenuSearchIndex
+from scheduler import JobScheduler
 
 app = Flask(__name__)
 app.config.from_object(config)  # Load config from config.py
@@ -18,6 +24,9 @@ app.secret_key = app.config['SECRET_KEY']  # Needed for flash messages
 client = None
 db = None
 
+# In-memory type-ahead index over the menu (rebuilt lazily after menu writes)
+menu_index = MenuSearchIndex(ttl_seconds=config.MENU_SEARCH_INDEX_TTL_SECONDS)
+
 
 def connect_db():
     """Establishes connection to MongoDB and ensures DB/Collections exist."""
@@ -49,13 +58,16 @@ def connect_db():
 
             # Ensure collections exist only if db connection succeeded
             if db is not None:
-                required_collections = ['menu_items', 'tables', 'orders', 'bills']
+                required_collections = ['menu_items', 'tables', 'orders', 'bills', 'kitchen_tickets']
                 try:
                     existing_collections = db.list_collection_names()
                     for coll in required_collections:
                         if coll not in existing_collections:
                             db.create_collection(coll)
                             print(f"Created collection: '{coll}'")
+                    ensure_indexes(db)
+                    if 'kitchen_tickets' not in existing_collections:
+                        backfill_kitchen_tickets(db)  # First run: mirror items of already-open orders
                 except errors.OperationFailure as e:
                     # Handle cases where user might not have listCollections permission
                     print(f"Warning: Could not list/create collections (permissions?): {e}")
@@ -108,6 +120,348 @@ def get_db():
     return db
 
 
+READ_PREFERENCE_MODES = {
+    "primary": Primary, "primaryPreferred": PrimaryPreferred, "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred, "nearest": Nearest
+}
+
+
+def build_read_preference(mode, max_staleness=-1):
+    """Builds a pymongo read preference from a config mode name and staleness bound (seconds)."""
+    pref_class = READ_PREFERENCE_MODES.get(mode)
+    if pref_class is None:
+        print(f"Warning: Unknown read preference '{mode}', falling back to primary.")
+        return Primary()
+    if pref_class is Primary:
+        return Primary()  # Primary reads cannot carry a staleness bound
+    if max_staleness != -1 and max_staleness < 90:
+        print(f"Warning: max staleness {max_staleness}s is below MongoDB's 90s minimum, using 90s.")
+        max_staleness = 90
+    return pref_class(max_staleness=max_staleness)
+
+
+# Built once at import (config is fixed for the process), so warnings print only once
+ANALYTICS_READ_PREF = build_read_preference(config.ANALYTICS_READ_PREFERENCE, config.ANALYTICS_MAX_STALENESS_SECONDS)
+
+
+def get_analytics_db():
+    """Returns a database handle for read-only analytics (dashboard sales, reports).
+    Uses ANALYTICS_READ_PREFERENCE so aggregations can run on secondaries."""
+    db_instance = db if db is not None else get_db()  # before_request has already verified the connection
+    if db_instance is None or client is None:
+        return None
+    return client.get_database(config.MONGO_DB_NAME, read_preference=ANALYTICS_READ_PREF)
+
+
+def ensure_indexes(db_instance):
+    """Creates indexes used by hot queries (idempotent)."""
+    # Per-station KDS queues: open orders, one station, active statuses, oldest first
+    db_instance.kitchen_tickets.create_index(
+        [("order_status", ASCENDING), ("station", ASCENDING), ("status", ASCENDING), ("order_time", ASCENDING)],
+        name="kds_station_queue"
+    )
+    db_instance.kitchen_tickets.create_index(
+        [("order_id", ASCENDING), ("item_index", ASCENDING)], name="order_item", unique=True
+    )
+    # Bill lookup by order (bill_view, bill_finalize)
+    db_instance.bills.create_index([("order_id", ASCENDING)], name="order_id")
+    # Date-range scans over bills (reports, dashboard, batch invoice export)
+    db_instance.bills.create_index([("billed_at", ASCENDING)], name="billed_at")
+    # Item trend lookups: one document per (day, menu item); sales_hourly is keyed by hour in _id
+    db_instance.sales_items_daily.create_index(
+        [("day", ASCENDING), ("item_key", ASCENDING)], name="day_item", unique=True
+    )
+    db_instance.sales_items_daily.create_index(
+        [("item_key", ASCENDING), ("day", ASCENDING)], name="item_day"
+    )
+
+
+# --- Kitchen Tickets ---
+# Each order item is mirrored into `kitchen_tickets` so KDS screens can query their station's
+# queue through an index instead of scanning the items array of every open order.
+KDS_ACTIVE_STATUSES = ['pending', 'preparing']
+
+
+def station_for_category(category):
+    """Maps a menu category to its KDS station (see KDS_STATION_MAP in config)."""
+    return config.KDS_STATION_MAP.get((category or '').strip().lower(), config.KDS_DEFAULT_STATION)
+
+
+def kds_stations():
+    """All configured KDS stations, default station first."""
+    others = sorted(set(config.KDS_STATION_MAP.values()) - {config.KDS_DEFAULT_STATION})
+    return [config.KDS_DEFAULT_STATION] + others
+
+
+def build_kitchen_ticket(order, item_index, item, category):
+    """Builds the kitchen_tickets document mirroring order['items'][item_index]."""
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": item.get('ticket_id') or ObjectId(), "order_id": order['_id'], "item_index": item_index,
+        "order_status": order.get('status', 'open'), "table_number": order.get('table_number'),
+        "menu_item_id": item.get('menu_item_id'), "item_name": item.get('name'), "quantity": item.get('quantity'),
+        "category": category, "station": station_for_category(category), "status": item.get('status', 'pending'),
+        "order_time": order.get('order_time'), "created_at": now, "updated_at": now
+    }
+
+
+def backfill_kitchen_tickets(db_instance):
+    """Creates tickets for items of open orders that predate the kitchen_tickets collection.
+
+    Items without a ticket_id get one written back to the order first, so status updates can
+    address the item and its ticket by the same ID.
+    """
+    created = 0
+    for order in db_instance.orders.find({"status": "open"}, {"table_number": 1, "items": 1, "order_time": 1, "status": 1}):
+        items = order.get('items', [])
+        menu_ids = [item.get('menu_item_id') for item in items if item.get('menu_item_id')]
+        categories = {m['_id']: m.get('category') for m in db_instance.menu_items.find({"_id": {"$in": menu_ids}}, {"category": 1})}
+        for index, item in enumerate(items):
+            if not item.get('ticket_id'):
+                ticket_id = ObjectId()
+                result = db_instance.orders.update_one(
+                    {"_id": order['_id'], f"items.{index}.ticket_id": {"$exists": False}},
+                    {"$set": {f"items.{index}.ticket_id": ticket_id}}
+                )
+                if result.modified_count == 0: continue  # Another worker got there first
+                item = {**item, "ticket_id": ticket_id}
+            ticket = build_kitchen_ticket(order, index, item, categories.get(item.get('menu_item_id')))
+            result = db_instance.kitchen_tickets.update_one({"_id": ticket['_id']}, {"$setOnInsert": ticket}, upsert=True)
+            if result.upserted_id is not None: created += 1
+    if created: print(f"Backfilled {created} kitchen tickets from open orders.")
+    return created
+
+
+# --- Sales Time Series ---
+# Incrementally maintained by bill_finalize so trend charts read a bounded number of
+# pre-aggregated documents (24 per day, one per item per day) instead of scanning bills.
+#   sales_hourly:      {_id: <hour start UTC>, total_sales, bill_count, subtotal, tax, discount}
+#   sales_items_daily: {day: <day start UTC>, item_key, menu_item_id, name, quantity, revenue}
+def as_utc(dt):
+    """PyMongo returns naive UTC datetimes; make them comparable with aware ones."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def hour_start(dt):
+    return as_utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(dt):
+    return as_utc(dt).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def sales_item_key(item):
+    """Menu item ID when present (stable across renames), otherwise the item name."""
+    return str(item['menu_item_id']) if item.get('menu_item_id') else f"name:{item.get('name')}"
+
+
+def bill_sales_deltas(bill):
+    """Returns (hour totals, {item_key: item totals}) contributed by one bill."""
+    hour_delta = {
+        "total_sales": bill.get('total_amount', 0.0), "bill_count": 1, "subtotal": bill.get('subtotal', 0.0),
+        "tax": bill.get('tax', 0.0), "discount": bill.get('discount', 0.0)
+    }
+    item_deltas = {}
+    for item in bill.get('items', []):
+        if item.get('status') == 'cancelled': continue
+        delta = item_deltas.setdefault(sales_item_key(item), {
+            "menu_item_id": item.get('menu_item_id'), "name": item.get('name'), "quantity": 0, "revenue": 0.0
+        })
+        delta["quantity"] += item.get('quantity', 0)
+        delta["revenue"] += item.get('price', 0.0) * item.get('quantity', 0)  # Pre-tax, pre-discount
+    return hour_delta, item_deltas
+
+
+def record_bill_sales(db_instance, bill):
+    """Adds a freshly finalized bill to the hourly and per-item daily series."""
+    hour_delta, item_deltas = bill_sales_deltas(bill)
+    db_instance.sales_hourly.update_one({"_id": hour_start(bill['billed_at'])}, {"$inc": hour_delta}, upsert=True)
+    day = day_start(bill['billed_at'])
+    item_ops = [
+        UpdateOne({"day": day, "item_key": key},
+                  {"$inc": {"quantity": delta["quantity"], "revenue": delta["revenue"]},
+                   "$set": {"menu_item_id": delta["menu_item_id"], "name": delta["name"]}},
+                  upsert=True)
+        for key, delta in item_deltas.items()
+    ]
+    if item_ops: db_instance.sales_items_daily.bulk_write(item_ops, ordered=False)
+
+
+def rebuild_sales_series(db_instance, start, end):
+    """Recomputes both series for bills in [start, end) from the bills collection.
+    Callers should keep `end` at or before today's start so live increments aren't overwritten
+    (the one-time backfill is the exception; see job_rebuild_sales_series)."""
+    hours, items = {}, {}
+    bills = db_instance.bills.find(
+        {"billed_at": {"$gte": start, "$lt": end}, "payment_status": "paid"},
+        {"billed_at": 1, "total_amount": 1, "subtotal": 1, "tax": 1, "discount": 1, "items": 1}
+    )
+    for bill in bills:
+        hour_delta, item_deltas = bill_sales_deltas(bill)
+        hour_totals = hours.setdefault(hour_start(bill['billed_at']), dict.fromkeys(hour_delta, 0))
+        for field, value in hour_delta.items(): hour_totals[field] += value
+        day = day_start(bill['billed_at'])
+        for key, delta in item_deltas.items():
+            item_totals = items.setdefault((day, key), {"menu_item_id": delta["menu_item_id"], "name": delta["name"], "quantity": 0, "revenue": 0.0})
+            item_totals["quantity"] += delta["quantity"]
+            item_totals["revenue"] += delta["revenue"]
+
+    hour_ops = [UpdateOne({"_id": hour}, {"$set": totals}, upsert=True) for hour, totals in hours.items()]
+    if hour_ops: db_instance.sales_hourly.bulk_write(hour_ops, ordered=False)
+    db_instance.sales_hourly.delete_many({"_id": {"$gte": start, "$lt": end, "$nin": list(hours)}})
+    item_ops = [UpdateOne({"day": day, "item_key": key}, {"$set": totals}, upsert=True) for (day, key), totals in items.items()]
+    if item_ops: db_instance.sales_items_daily.bulk_write(item_ops, ordered=False)
+    day = day_start(start)
+    while day < end:
+        keep_keys = [key for (d, key) in items if d == day]
+        db_instance.sales_items_daily.delete_many({"day": day, "item_key": {"$nin": keep_keys}})
+        day += timedelta(days=1)
+    return {"hours": len(hours), "item_days": len(items)}
+
+
+# --- Status Counters ---
+# A single `counters` document tracks table/order status counts so the dashboard reads them in
+# O(1). Every status transition $inc's it (and its version); the reconcile_status_counters job
+# corrects any drift.
+#   {_id: "status", version, tables: {total, available, occupied, reserved, cleaning}, orders: {open, closed}}
+STATUS_COUNTERS_ID = "status"
+TABLE_STATUSES = ["available", "occupied", "reserved", "cleaning"]
+COUNTED_ORDER_STATUSES = ["open", "closed"]
+
+
+def bump_status_counters(db_instance, deltas):
+    """Atomically applies {"tables.available": -1, ...}; zero deltas are skipped.
+    If the counters document doesn't exist yet it is built by a full recount (which already
+    includes this change) rather than upserted from the deltas alone."""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if deltas:
+        result = db_instance.counters.update_one({"_id": STATUS_COUNTERS_ID}, {"$inc": {**deltas, "version": 1}})
+        if result.matched_count == 0:
+            reconcile_status_counters(db_instance)
+
+
+def table_transition_deltas(old_status, new_status):
+    if old_status == new_status: return {}
+    return {f"tables.{old_status or 'unknown'}": -1, f"tables.{new_status}": 1}
+
+
+def reconcile_status_counters(db_instance, attempts=3):
+    """Recounts tables/orders by status and $inc's the counters by the difference. Returns the drift found.
+
+    The difference is applied only if no transition bumped the document's version during the
+    recount (otherwise it retries), so concurrent $inc's are never overwritten.
+    """
+    for _ in range(attempts):
+        stored = db_instance.counters.find_one({"_id": STATUS_COUNTERS_ID})
+        tables = {status: 0 for status in TABLE_STATUSES}
+        for row in db_instance.tables.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            tables[row['_id'] or 'unknown'] = row['count']
+        tables["total"] = sum(tables.values())
+        orders = {status: 0 for status in COUNTED_ORDER_STATUSES}
+        for row in db_instance.orders.aggregate([
+            {"$match": {"status": {"$in": COUNTED_ORDER_STATUSES}}}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]):
+            orders[row['_id']] = row['count']
+        now = datetime.now(timezone.utc)
+
+        if stored is None:
+            try:
+                db_instance.counters.insert_one({"_id": STATUS_COUNTERS_ID, "version": 0, "tables": tables, "orders": orders, "reconciled_at": now})
+                return {}
+            except errors.DuplicateKeyError:
+                continue  # A transition created it meanwhile; reconcile against that
+
+        drift = {}
+        for group, actual in (("tables", tables), ("orders", orders)):
+            stored_group = stored.get(group, {})
+            for key in set(actual) | set(stored_group):
+                difference = actual.get(key, 0) - stored_group.get(key, 0)
+                if difference: drift[f"{group}.{key}"] = difference
+        result = db_instance.counters.update_one(
+            {"_id": STATUS_COUNTERS_ID, "version": stored.get('version')},
+            {"$inc": {**drift, "version": 1}, "$set": {"reconciled_at": now}}
+        )
+        if result.matched_count:
+            return {key.replace('.', '_'): value for key, value in drift.items()}
+    print("Status counters changed during every reconcile attempt; will retry next run.")
+    return None
+
+
+def read_status_counters(db_instance):
+    """Returns the counters document, building it on first use."""
+    counters = db_instance.counters.find_one({"_id": STATUS_COUNTERS_ID})
+    if counters is None:
+        reconcile_status_counters(db_instance)
+        counters = db_instance.counters.find_one({"_id": STATUS_COUNTERS_ID}) or {}
+    return counters
+
+
+# --- Shared Read Queries (used by the Flask routes and the async views in asgi.py) ---
+KDS_TICKET_PROJECTION = {
+    "order_id": 1, "item_index": 1, "table_number": 1, "item_name": 1, "quantity": 1,
+    "status": 1, "station": 1, "order_time": 1
+}
+
+
+def kds_ticket_filter(station=None):
+    ticket_filter = {"order_status": "open", "status": {"$in": KDS_ACTIVE_STATUSES}}
+    if station: ticket_filter["station"] = station
+    return ticket_filter
+
+
+def kds_item_from_ticket(ticket):
+    return {
+        "order_id": str(ticket['order_id']), "table_number": ticket.get('table_number', 'N/A'), "item_name": ticket.get('item_name'),
+        "quantity": ticket.get('quantity'), "status": ticket.get('status'), "ticket_id": str(ticket['_id']),
+        "station": ticket.get('station'), "order_time": ticket.get('order_time')
+    }
+
+
+def kds_snapshot_json(kds_items):
+    """Serialized KDS queue for stream events (datetimes/ObjectIds as strings)."""
+    return json.dumps({"items": kds_items}, default=str, sort_keys=True)
+
+
+def sales_summary_pipeline(start, end):
+    """Total paid sales and bill count for start <= billed_at < end."""
+    return [
+        {"$match": {"billed_at": {"$gte": start, "$lt": end}, "payment_status": "paid"}},
+        {"$group": {"_id": None, "total_sales": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}
+    ]
+
+
+def top_items_pipeline(start, end, limit=5):
+    return [
+        {"$match": {"billed_at": {"$gte": start, "$lt": end}, "payment_status": "paid"}},
+        {"$unwind": "$items"}, {"$match": {"items.status": {"$ne": "cancelled"}}},
+        {"$group": {"_id": "$items.name", "total_quantity": {"$sum": "$items.quantity"}}},
+        {"$sort": {"total_quantity": -1}}, {"$limit": limit}
+    ]
+
+
+def report_period_bounds(period, now):
+    """Returns (start, end_exclusive, display name) for a named report period, or None if unknown."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'today': return midnight, midnight + timedelta(days=1), "Today"
+    if period == 'yesterday': return midnight - timedelta(days=1), midnight, "Yesterday"
+    month_start = midnight.replace(day=1)
+    if period == 'month': return month_start, month_start + relativedelta(months=1), "This Month"
+    if period == 'prev_month': return month_start - relativedelta(months=1), month_start, "Last Month"
+    if period == 'year':
+        year_start = month_start.replace(month=1)
+        return year_start, year_start + relativedelta(years=1), "This Year"
+    return None
+
+
+def compact_bill_items(items):
+    """Bill line items: menu ID reference plus the name/price/quantity charged. Cancelled items
+    and order-only fields (item status, ticket_id) are dropped since the bill never shows them."""
+    return [
+        {"menu_item_id": item.get('menu_item_id'), "name": item.get('name'), "price": item.get('price', 0.0), "quantity": item.get('quantity', 0)}
+        for item in items if item.get('status') != 'cancelled'
+    ]
+
+
 def calculate_order_total(items):
     """Calculates subtotal, tax, and total for a list of order items."""
     if not items:  # Handle empty item list
@@ -134,47 +488,35 @@ def index():
 
     if db_instance is not None:
         try:
-            # Table Metrics
-            tables_metrics["total"] = db_instance.tables.count_documents({})
-            tables_metrics["available"] = db_instance.tables.count_documents({"status": "available"})
-
-            # Order Metrics
-            orders_metrics["active"] = db_instance.orders.count_documents({"status": "open"})
-            orders_metrics["pending_bills"] = db_instance.orders.count_documents({"status": "closed"})
+            # Table & Order Metrics (maintained counters, no collection scans)
+            counters = read_status_counters(db_instance)
+            tables_metrics["total"] = counters.get('tables', {}).get('total', 0)
+            tables_metrics["available"] = counters.get('tables', {}).get('available', 0)
+            orders_metrics["active"] = counters.get('orders', {}).get('open', 0)
+            orders_metrics["pending_bills"] = counters.get('orders', {}).get('closed', 0)
             orders_metrics["total"] = tables_metrics["total"] if tables_metrics["total"] > 0 else 1
 
             # Sales Metrics (Today)
-            today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            pipeline_today = [
-                {"$match": {"billed_at": {"$gte": today_start, "$lt": today_end}, "payment_status": "paid"}},
-                {"$group": {"_id": None, "total_sales": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}
-            ]
-            today_sales_result = list(db_instance.bills.aggregate(pipeline_today))
+            today_start, today_end, _ = report_period_bounds('today', datetime.now(timezone.utc))
+            pipeline_today = sales_summary_pipeline(today_start, today_end)
+            analytics_db = get_analytics_db()
+            if analytics_db is None: analytics_db = db_instance
+            today_sales_result = list(analytics_db.bills.aggregate(pipeline_today))
             today_sales_data = today_sales_result[0] if today_sales_result else {"total_sales": 0, "count": 0}
             sales_metrics["today"] = today_sales_data.get('total_sales', 0)
             sales_metrics["count"] = today_sales_data.get('count', 0)
 
             # KDS Preview (e.g., first 3 items)
-            open_orders = list(db_instance.orders.find(
-                {"status": "open"},
-                {"_id": 1, "table_number": 1, "items": 1, "order_time": 1}
-            ).sort("order_time").limit(5))
-
-            preview_count = 0
-            max_preview = 3
-            for order in open_orders:
-                if preview_count >= max_preview: break
-                for item in order.get('items', []):
-                    if item.get('status') in ['pending', 'preparing']:
-                        kds_item = {
-                            "table_number": order.get('table_number', 'N/A'),
-                            "item_name": item.get('name'), "quantity": item.get('quantity'),
-                            "status": item.get('status'), "order_time": order.get('order_time')
-                        }
-                        kds_preview.append(kds_item)
-                        preview_count += 1
-                        if preview_count >= max_preview: break
+            preview_tickets = db_instance.kitchen_tickets.find(
+                {"order_status": "open", "status": {"$in": KDS_ACTIVE_STATUSES}},
+                {"table_number": 1, "item_name": 1, "quantity": 1, "status": 1, "order_time": 1}
+            ).sort([("order_time", 1), ("item_index", 1)]).limit(3)
+            for ticket in preview_tickets:
+                kds_preview.append({
+                    "table_number": ticket.get('table_number', 'N/A'),
+                    "item_name": ticket.get('item_name'), "quantity": ticket.get('quantity'),
+                    "status": ticket.get('status'), "order_time": ticket.get('order_time')
+                })
 
         except errors.PyMongoError as e:
              print(f"Database error fetching dashboard metrics: {e}")
@@ -224,6 +566,7 @@ def menu_manage():
                     "category": category, "is_available": is_available,
                     "created_at": datetime.now(timezone.utc)
                 })
+                menu_index.invalidate()
                 flash(f"Menu item '{name}' added successfully!", "success")
         except ValueError:
              flash("Invalid price format. Please enter a number.", "danger")
@@ -236,6 +579,8 @@ def menu_manage():
     query_filter = {}
     items = []
     if search_query:
+        # Admin search stays DB-backed (substring match on name/category, always current,
+        # no result cap); the in-memory index serves the type-ahead endpoint /menu/search
         query_filter = {
             "$or": [
                 {"name": {"$regex": search_query, "$options": "i"}},
@@ -252,6 +597,28 @@ def menu_manage():
     return render_template('menu_manage.html', items=items, search_query=search_query, db_error=db_error_flag)
 
 
+@app.route('/menu/search')
+def menu_search():
+    """JSON type-ahead lookup over the menu, e.g. /menu/search?q=burg&limit=10&available=1"""
+    db_instance = get_db()
+    if db_instance is None: return jsonify({"success": False, "error": "Database error."}), 500
+    query = request.args.get('q', '')
+    available_only = request.args.get('available', '0') in ('1', 'true')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid limit."}), 400
+    try:
+        menu_index.ensure_fresh(db_instance)
+        started = time.perf_counter()
+        results = menu_index.search(query, limit=limit, available_only=available_only)
+        took_ms = (time.perf_counter() - started) * 1000
+        return jsonify({"success": True, "query": query, "results": results, "took_ms": round(took_ms, 3)})
+    except Exception as e:
+        print(f"Error searching menu for '{query}': {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/menu/edit/<item_id>', methods=['GET', 'POST'])
 def menu_edit(item_id):
     db_instance = get_db()
@@ -286,6 +653,7 @@ def menu_edit(item_id):
                         "updated_at": datetime.now(timezone.utc)
                     }}
                 )
+                menu_index.invalidate()
                 flash(f"Menu item '{name}' updated successfully!", "success")
                 return redirect(url_for('menu_manage'))
             except ValueError:
@@ -317,6 +685,7 @@ def menu_delete(item_id):
     try:
         obj_id = ObjectId(item_id)
         result = db_instance.menu_items.delete_one({"_id": obj_id})
+        menu_index.invalidate()
         if result.deleted_count > 0: flash("Menu item deleted.", "success")
         else: flash("Menu item not found.", "warning")
     except Exception as e:
@@ -335,6 +704,7 @@ def menu_toggle_availability(item_id):
         if item:
             new_status = not item.get('is_available', False)
             db_instance.menu_items.update_one({"_id": obj_id}, {"$set": {"is_available": new_status}})
+            menu_index.invalidate()
             return jsonify({"success": True, "new_status": new_status})
         else: return jsonify({"success": False, "error": "Item not found"}), 404
     except Exception as e:
@@ -367,6 +737,7 @@ def tables_manage():
                     "table_number": table_number, "capacity": capacity,
                     "status": "available", "created_at": datetime.now(timezone.utc)
                 })
+                bump_status_counters(db_instance, {"tables.total": 1, "tables.available": 1})
                 flash(f"Table '{table_number}' added.", "success")
         except ValueError: flash("Invalid capacity format.", "danger")
         except Exception as e:
@@ -375,13 +746,15 @@ def tables_manage():
         return redirect(url_for('tables_manage'))
 
     tables = []
+    table_counts = {}
     try:
         tables = list(db_instance.tables.find().sort("table_number"))
+        table_counts = read_status_counters(db_instance).get('tables', {})
     except Exception as e:
         flash(f"Error fetching tables: {e}", "danger")
         print(f"Error fetching tables: {e}")
         db_error_flag = True
-    return render_template('tables_manage.html', tables=tables, db_error=db_error_flag)
+    return render_template('tables_manage.html', tables=tables, table_counts=table_counts, db_error=db_error_flag)
 
 
 @app.route('/tables/update_status/<table_id>', methods=['POST'])
@@ -393,16 +766,17 @@ def table_update_status(table_id):
     try:
         obj_id = ObjectId(table_id)
         new_status = request.form.get('status')
-        valid_statuses = ["available", "occupied", "reserved", "cleaning"]
-        if not new_status or new_status not in valid_statuses:
+        if not new_status or new_status not in TABLE_STATUSES:
              flash("Invalid status.", "warning")
              return redirect(url_for('tables_manage'))
 
         update_doc = {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc)}}
         if new_status == "available": update_doc["$unset"] = {"current_order_id": ""}
 
-        result = db_instance.tables.update_one({"_id": obj_id}, update_doc)
-        if result.matched_count > 0: flash(f"Table status updated to '{new_status}'.", "success")
+        previous = db_instance.tables.find_one_and_update({"_id": obj_id}, update_doc, projection={"status": 1})
+        if previous is not None:
+            bump_status_counters(db_instance, table_transition_deltas(previous.get('status'), new_status))
+            flash(f"Table status updated to '{new_status}'.", "success")
         else: flash("Table not found.", "warning")
     except Exception as e:
         flash(f"Error updating status: {e}", "danger")
@@ -422,8 +796,10 @@ def table_delete(table_id):
         if table and table.get("status") == "occupied":
              flash("Cannot delete occupied table.", "warning")
              return redirect(url_for('tables_manage'))
-        result = db_instance.tables.delete_one({"_id": obj_id})
-        if result.deleted_count > 0: flash("Table deleted.", "success")
+        deleted = db_instance.tables.find_one_and_delete({"_id": obj_id, "status": {"$ne": "occupied"}}, projection={"status": 1})
+        if deleted is not None:
+            bump_status_counters(db_instance, {"tables.total": -1, f"tables.{deleted.get('status') or 'unknown'}": -1})
+            flash("Table deleted.", "success")
         else: flash("Table not found.", "warning")
     except Exception as e:
         flash(f"Error deleting table: {e}", "danger")
@@ -455,6 +831,7 @@ def order_new(table_id):
 
         if request.method == 'POST':
             order_items = []
+            item_categories = {}
             try:
                 for key, value in request.form.items():
                     if key.startswith("quantity_") and value and int(value) > 0:
@@ -464,8 +841,10 @@ def order_new(table_id):
                         if menu_item:
                             order_items.append({
                                 "menu_item_id": menu_item['_id'], "name": menu_item['name'],
-                                "price": menu_item['price'], "quantity": quantity, "status": "pending"
+                                "price": menu_item['price'], "quantity": quantity, "status": "pending",
+                                "ticket_id": ObjectId()
                             })
+                            item_categories[menu_item['_id']] = menu_item.get('category')
                         else: print(f"Warn: Initial item ID {menu_item_id_str} not found.")
             except Exception as e:
                  flash(f"Error processing initial items: {e}. Order created empty.", "danger")
@@ -479,10 +858,19 @@ def order_new(table_id):
                 "tax": tax, "total_amount": total, "created_at": datetime.now(timezone.utc)
             }
             result = db_instance.orders.insert_one(new_order)
-            db_instance.tables.update_one(
+            if order_items:
+                db_instance.kitchen_tickets.insert_many([
+                    build_kitchen_ticket(new_order, index, item, item_categories.get(item['menu_item_id']))
+                    for index, item in enumerate(order_items)
+                ])
+            previous_table = db_instance.tables.find_one_and_update(
                 {"_id": table_obj_id},
-                {"$set": {"status": "occupied", "current_order_id": result.inserted_id, "updated_at": datetime.now(timezone.utc)}}
+                {"$set": {"status": "occupied", "current_order_id": result.inserted_id, "updated_at": datetime.now(timezone.utc)}},
+                projection={"status": 1}
             )
+            deltas = {"orders.open": 1}
+            if previous_table is not None: deltas.update(table_transition_deltas(previous_table.get('status'), "occupied"))
+            bump_status_counters(db_instance, deltas)
             flash(f"New order started for Table {table.get('table_number', table_id)}.", "success")
             if not order_items and request.form: flash("No initial items added.", "info")
             return redirect(url_for('order_view', order_id=str(result.inserted_id)))
@@ -498,6 +886,13 @@ def order_new(table_id):
         return redirect(url_for('tables_manage'))
 
 
+# Only the fields order_view.html renders
+ORDER_VIEW_PROJECTION = {
+    "table_number": 1, "status": 1, "order_time": 1, "subtotal": 1, "tax": 1, "total_amount": 1,
+    "items.name": 1, "items.price": 1, "items.quantity": 1, "items.status": 1, "items.ticket_id": 1
+}
+
+
 @app.route('/order/view/<order_id>', methods=['GET'])
 def order_view(order_id):
     db_instance = get_db()
@@ -505,13 +900,15 @@ def order_view(order_id):
         flash("Database connection error.", "danger")
         return redirect(url_for('index'))
     try:
-        order = db_instance.orders.find_one({"_id": ObjectId(order_id)})
+        order = db_instance.orders.find_one({"_id": ObjectId(order_id)}, ORDER_VIEW_PROJECTION)
         if not order:
             flash("Order not found.", "warning")
             return redirect(url_for('index'))
-        menu_items = list(db_instance.menu_items.find({"is_available": True}).sort("category"))
-        subtotal, tax, total = calculate_order_total(order.get('items', []))
-        order['subtotal'], order['tax'], order['total_amount'] = subtotal, tax, total
+        menu_items = []
+        if order.get('status') == 'open':  # The add-item picker is only shown for open orders
+            menu_items = list(db_instance.menu_items.find({"is_available": True}, {"name": 1, "price": 1, "category": 1}).sort("category"))
+        if 'total_amount' not in order:  # Totals are stored on every item change; recompute only for legacy docs
+            order['subtotal'], order['tax'], order['total_amount'] = calculate_order_total(order.get('items', []))
         return render_template('order_view.html', order=order, menu_items=menu_items)
     except Exception as e:
         flash(f"Error loading order: {e}", "danger")
@@ -537,21 +934,24 @@ def order_add_item(order_id):
              flash("Item not found/unavailable.", "warning")
              return redirect(url_for('order_view', order_id=order_id))
 
-        order_item = {"menu_item_id": menu_item['_id'], "name": menu_item['name'], "price": menu_item['price'], "quantity": quantity, "status": "pending"}
-        update_result = db_instance.orders.update_one(
+        order_item = {"menu_item_id": menu_item['_id'], "name": menu_item['name'], "price": menu_item['price'], "quantity": quantity, "status": "pending", "ticket_id": ObjectId()}
+        order = db_instance.orders.find_one_and_update(
             {"_id": ObjectId(order_id), "status": "open"},
-            {"$push": {"items": order_item}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+            {"$push": {"items": order_item}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            projection={"items": 1, "table_number": 1, "order_time": 1, "status": 1},
+            return_document=ReturnDocument.AFTER
         )
-        if update_result.matched_count == 0:
+        if order is None:
              flash("Order not found/open.", "warning")
              return redirect(url_for('order_view', order_id=order_id))
 
-        order = db_instance.orders.find_one({"_id": ObjectId(order_id)})
-        if order:
-            subtotal, tax, total = calculate_order_total(order.get('items', []))
-            db_instance.orders.update_one({"_id": ObjectId(order_id)}, {"$set": {"subtotal": subtotal, "tax": tax, "total_amount": total, "updated_at": datetime.now(timezone.utc)}})
-            flash(f"Added {quantity} x {menu_item['name']}.", "success")
-        else: flash("Item added, recalc failed.", "warning")
+        # Locate the pushed item by ticket_id (concurrent adds may have pushed after it)
+        item_index = next(i for i, item in enumerate(order.get('items', [])) if item.get('ticket_id') == order_item['ticket_id'])
+        db_instance.kitchen_tickets.insert_one(build_kitchen_ticket(order, item_index, order_item, menu_item.get('category')))
+
+        subtotal, tax, total = calculate_order_total(order.get('items', []))
+        db_instance.orders.update_one({"_id": ObjectId(order_id)}, {"$set": {"subtotal": subtotal, "tax": tax, "total_amount": total, "updated_at": datetime.now(timezone.utc)}})
+        flash(f"Added {quantity} x {menu_item['name']}.", "success")
         return redirect(url_for('order_view', order_id=order_id))
 
     except Exception as e:
@@ -560,8 +960,10 @@ def order_add_item(order_id):
         return redirect(url_for('order_view', order_id=order_id))
 
 
-@app.route('/order/update_item_status/<order_id>/<int:item_index>', methods=['POST'])
-def order_update_item_status(order_id, item_index):
+@app.route('/order/update_item_status/<order_id>/<ticket_id>', methods=['POST'])
+def order_update_item_status(order_id, ticket_id):
+    if not (ObjectId.is_valid(order_id) and ObjectId.is_valid(ticket_id)):
+        return jsonify({"success": False, "error": "Order/item not found."}), 404
     db_instance = get_db()
     if db_instance is None: return jsonify({"success": False, "error": "Database error."}), 500
     try:
@@ -569,12 +971,17 @@ def order_update_item_status(order_id, item_index):
         valid_statuses = ["pending", "preparing", "served", "cancelled"]
         if new_status not in valid_statuses: return jsonify({"success": False, "error": "Invalid status."}), 400
 
-        update_key = f"items.{item_index}.status"
+        # Items are addressed by their ticket_id (stable), not their position in the array
+        now = datetime.now(timezone.utc)
         result = db_instance.orders.update_one(
-            {"_id": ObjectId(order_id), f"items.{item_index}": {"$exists": True}},
-            {"$set": {update_key: new_status, "updated_at": datetime.now(timezone.utc)}}
+            {"_id": ObjectId(order_id), "items.ticket_id": ObjectId(ticket_id)},
+            {"$set": {"items.$.status": new_status, "updated_at": now}}
         )
         if result.matched_count > 0:
+            db_instance.kitchen_tickets.update_one(
+                {"_id": ObjectId(ticket_id)},
+                {"$set": {"status": new_status, "updated_at": now, f"{new_status}_at": now}}
+            )
             if new_status == 'cancelled':
                 order = db_instance.orders.find_one({"_id": ObjectId(order_id)})
                 if order:
@@ -584,7 +991,7 @@ def order_update_item_status(order_id, item_index):
             return jsonify({"success": True, "new_status": new_status})
         else: return jsonify({"success": False, "error": "Order/item not found."}), 404
     except Exception as e:
-        print(f"Error updating item status {order_id}/{item_index}: {e}")
+        print(f"Error updating item status {order_id}/{ticket_id}: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -605,7 +1012,9 @@ def order_close(order_id):
                 flash("Cannot close empty order.", "warning")
                 return redirect(url_for('order_view', order_id=order_id))
             subtotal, tax, total = calculate_order_total(order.get('items', []))
-            db_instance.orders.update_one({"_id": obj_id}, {"$set": {"status": "closed", "closed_time": datetime.now(timezone.utc), "subtotal": subtotal, "tax": tax, "total_amount": total, "updated_at": datetime.now(timezone.utc)}})
+            close_result = db_instance.orders.update_one({"_id": obj_id, "status": "open"}, {"$set": {"status": "closed", "closed_time": datetime.now(timezone.utc), "subtotal": subtotal, "tax": tax, "total_amount": total, "updated_at": datetime.now(timezone.utc)}})
+            if close_result.modified_count: bump_status_counters(db_instance, {"orders.open": -1, "orders.closed": 1})
+            db_instance.kitchen_tickets.update_many({"order_id": obj_id}, {"$set": {"order_status": "closed", "updated_at": datetime.now(timezone.utc)}})
             flash("Order closed.", "success")
             return redirect(url_for('billing'))
         elif order['status'] == 'closed':
@@ -629,7 +1038,10 @@ def billing():
     if db_instance is None:
         flash("Database error.", "danger")
         return render_template('billing.html', orders=[], db_error=True)
-    try: closed_orders = list(db_instance.orders.find({"status": "closed"}).sort("closed_time", -1))
+    try: closed_orders = list(db_instance.orders.aggregate([
+            {"$match": {"status": "closed"}}, {"$sort": {"closed_time": -1}},
+            {"$project": {"table_number": 1, "closed_time": 1, "total_amount": 1, "item_count": {"$size": {"$ifNull": ["$items", []]}}}}
+        ]))
     except Exception as e:
         flash(f"Error fetching bills: {e}", "danger"); print(f"Error fetching bills: {e}"); db_error_flag = True
     return render_template('billing.html', orders=closed_orders, db_error=db_error_flag)
@@ -640,14 +1052,21 @@ def bill_view(order_id):
     db_instance = get_db()
     if db_instance is None: flash("Database error.", "danger"); return redirect(url_for('billing'))
     try:
-        order = db_instance.orders.find_one({"_id": ObjectId(order_id)})
+        bill = db_instance.bills.find_one({"order_id": ObjectId(order_id)})
+        # A finalized bill already carries items and totals; otherwise read them from the closed order
+        order_projection = {"table_number": 1, "status": 1} if bill else {
+            "table_number": 1, "status": 1, "subtotal": 1, "tax": 1, "total_amount": 1,
+            "items.name": 1, "items.price": 1, "items.quantity": 1, "items.status": 1
+        }
+        order = db_instance.orders.find_one({"_id": ObjectId(order_id)}, order_projection)
         if not order: flash("Order not found.", "warning"); return redirect(url_for('billing'))
         if order['status'] not in ['closed', 'billed']:
              flash("Order not closed.", "warning"); return redirect(url_for('order_view', order_id=order_id))
-        bill = db_instance.bills.find_one({"order_id": ObjectId(order_id)})
-        subtotal, tax, total = calculate_order_total(order.get('items', []))
-        order['subtotal'], order['tax'] = subtotal, tax
-        order['total_amount'] = bill['total_amount'] if bill else total
+        if bill:
+            order['items'], order['subtotal'], order['tax'] = bill.get('items', []), bill.get('subtotal', 0.0), bill.get('tax', 0.0)
+            order['total_amount'] = bill['total_amount']
+        elif 'total_amount' not in order:
+            order['subtotal'], order['tax'], order['total_amount'] = calculate_order_total(order.get('items', []))
         return render_template('bill_view.html', order=order, bill=bill, tax_rate=config.TAX_RATE_PERCENT)
     except Exception as e:
         flash(f"Error loading bill: {e}", "danger"); print(f"Error loading bill {order_id}: {e}"); return redirect(url_for('billing'))
@@ -659,10 +1078,13 @@ def bill_finalize(order_id):
     if db_instance is None: flash("Database error.", "danger"); return redirect(url_for('billing'))
     try:
         order_obj_id = ObjectId(order_id)
-        order = db_instance.orders.find_one({"_id": order_obj_id})
+        order = db_instance.orders.find_one({"_id": order_obj_id}, {
+            "status": 1, "table_number": 1, "table_id": 1,
+            "items.menu_item_id": 1, "items.name": 1, "items.price": 1, "items.quantity": 1, "items.status": 1
+        })
         if not order: flash("Order not found.", "warning"); return redirect(url_for('billing'))
         if order['status'] != 'closed': flash(f"Order status '{order['status']}'.", "warning"); return redirect(url_for('bill_view', order_id=order_id))
-        if db_instance.bills.find_one({"order_id": order_obj_id}): flash("Bill already finalized.", "warning"); return redirect(url_for('bill_view', order_id=order_id))
+        if db_instance.bills.find_one({"order_id": order_obj_id}, {"_id": 1}): flash("Bill already finalized.", "warning"); return redirect(url_for('bill_view', order_id=order_id))
 
         payment_method = request.form.get('payment_method', 'Cash')
         discount = float(request.form.get('discount', 0.0))
@@ -670,16 +1092,23 @@ def bill_finalize(order_id):
         total_after_discount = max(0, (subtotal + tax) - discount)
 
         bill_doc = {
-            "order_id": order['_id'], "table_number": order.get('table_number'), "items": order.get('items', []),
+            "order_id": order['_id'], "table_number": order.get('table_number'), "items": compact_bill_items(order.get('items', [])),
             "subtotal": subtotal, "tax": tax, "tax_rate_percent": config.TAX_RATE_PERCENT, "discount": discount,
             "total_amount": total_after_discount, "payment_method": payment_method, "payment_status": "paid",
             "billed_at": datetime.now(timezone.utc)
         }
         bill_result = db_instance.bills.insert_one(bill_doc)
-        db_instance.orders.update_one({"_id": order_obj_id}, {"$set": {"status": "billed", "final_bill_id": bill_result.inserted_id, "updated_at": datetime.now(timezone.utc)}})
+        try:
+            record_bill_sales(db_instance, bill_doc)
+        except errors.PyMongoError as e:  # The bill stands; the nightly rebuild repairs the series
+            print(f"Warning: Could not update sales series for bill {bill_result.inserted_id}: {e}")
+        billed_result = db_instance.orders.update_one({"_id": order_obj_id, "status": "closed"}, {"$set": {"status": "billed", "final_bill_id": bill_result.inserted_id, "updated_at": datetime.now(timezone.utc)}})
         table_update = {"$set": {"status": "available", "updated_at": datetime.now(timezone.utc)}, "$unset": {"current_order_id": ""}}
-        if order.get('table_id'): db_instance.tables.update_one({"_id": order['table_id']}, table_update)
-        else: db_instance.tables.update_one({"table_number": order.get('table_number')}, table_update)
+        table_filter = {"_id": order['table_id']} if order.get('table_id') else {"table_number": order.get('table_number')}
+        previous_table = db_instance.tables.find_one_and_update(table_filter, table_update, projection={"status": 1})
+        deltas = {"orders.closed": -1 if billed_result.modified_count else 0}
+        if previous_table is not None: deltas.update(table_transition_deltas(previous_table.get('status'), "available"))
+        bump_status_counters(db_instance, deltas)
 
         flash(f"Bill finalized. Payment: {payment_method}.", "success")
         return redirect(url_for('billing'))
@@ -690,25 +1119,38 @@ def bill_finalize(order_id):
 # --- Kitchen Display System (KDS) ---
 @app.route('/kds')
 def kds():
+    """KDS queue, optionally for one station (e.g. /kds?station=bar), served from kitchen_tickets."""
+    station = request.args.get('station', '').strip().lower() or None
+    stations = kds_stations()
     db_instance = get_db(); db_error_flag = db_instance is None; kds_items = []
-    if db_instance is None: flash("Database error.", "danger"); return render_template('kds.html', kds_items=[], db_error=True)
+    if db_instance is None: flash("Database error.", "danger"); return render_template('kds.html', kds_items=[], db_error=True, stations=stations, selected_station=station)
     try:
-        open_orders = list(db_instance.orders.find({"status": "open"}, {"_id": 1, "table_number": 1, "items": 1, "order_time": 1}).sort("order_time"))
-        for order in open_orders:
-            for index, item in enumerate(order.get('items', [])):
-                if item.get('status') in ['pending', 'preparing']:
-                    kds_items.append({
-                        "order_id": str(order['_id']), "table_number": order.get('table_number', 'N/A'), "item_name": item.get('name'),
-                        "quantity": item.get('quantity'), "status": item.get('status'), "item_index": index, "order_time": order.get('order_time') })
+        tickets = db_instance.kitchen_tickets.find(kds_ticket_filter(station), KDS_TICKET_PROJECTION).sort("order_time")
+        kds_items = [kds_item_from_ticket(ticket) for ticket in tickets]
         kds_items.sort(key=lambda x: (x['order_time'] or datetime.min, x['status'] == 'pending'))
     except Exception as e: flash(f"Error fetching KDS items: {e}", "danger"); print(f"Error fetching KDS items: {e}"); db_error_flag = True
-    return render_template('kds.html', kds_items=kds_items, db_error=db_error_flag)
+    return render_template('kds.html', kds_items=kds_items, db_error=db_error_flag, stations=stations, selected_station=station)
+
+
+@app.route('/kds/snapshot')
+def kds_snapshot():
+    """Current KDS queue as JSON (optional ?station=), polled by KDS screens under the WSGI server.
+    Live push (/kds/stream) is only served in async mode, see asgi.py."""
+    db_instance = get_db()
+    if db_instance is None: return jsonify({"success": False, "error": "Database error."}), 500
+    station = request.args.get('station', '').strip().lower() or None
+    try:
+        tickets = db_instance.kitchen_tickets.find(kds_ticket_filter(station), KDS_TICKET_PROJECTION).sort("order_time")
+        return Response(kds_snapshot_json([kds_item_from_ticket(ticket) for ticket in tickets]), mimetype='application/json')
+    except errors.PyMongoError as e:
+        print(f"Error fetching KDS snapshot: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
 
 # --- Analytics & Reporting (with Custom Date Range) ---
 @app.route('/reports')
 def reports():
-    db_instance = get_db()
+    db_instance = get_analytics_db()  # Reports tolerate slight staleness; keep them off the primary
     db_error_flag = db_instance is None
     report_data = {"total_sales": 0, "bill_count": 0, "top_selling_items": []}
 
@@ -740,26 +1182,20 @@ def reports():
 
         # --- Calculate Dates if Not Custom (or if Custom Failed) ---
         if selected_period != 'custom':
-             if selected_period == 'today': start_date = now.replace(hour=0, minute=0, second=0, microsecond=0); end_date = start_date + timedelta(days=1); selected_period_display = "Today"
-             elif selected_period == 'yesterday': yesterday = now - timedelta(days=1); start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0); end_date = start_date + timedelta(days=1); selected_period_display = "Yesterday"
-             elif selected_period == 'month': start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0); end_date = (start_date + relativedelta(months=1)); selected_period_display = "This Month"
-             elif selected_period == 'prev_month': last_month_end = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0); start_date = last_month_end - relativedelta(months=1); end_date = last_month_end; selected_period_display = "Last Month"
-             elif selected_period == 'year': start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0); end_date = (start_date + relativedelta(years=1)); selected_period_display = "This Year"
-             else: # Default if invalid period string
-                 if selected_period != 'today': flash(f"Invalid period '{selected_period}'. Defaulting to Today.", "warning")
+             bounds = report_period_bounds(selected_period, now)
+             if bounds is None: # Default if invalid period string
+                 flash(f"Invalid period '{selected_period}'. Defaulting to Today.", "warning")
                  selected_period = 'today'
-                 start_date = now.replace(hour=0, minute=0, second=0, microsecond=0); end_date = start_date + timedelta(days=1); selected_period_display = "Today"
+                 bounds = report_period_bounds('today', now)
+             start_date, end_date, selected_period_display = bounds
 
         # --- Database Aggregation ---
         if start_date and end_date and db_instance is not None:
             print(f"Report: {selected_period}, Start: {start_date}, End: {end_date}")
-            match_criteria = {"billed_at": {"$gte": start_date, "$lt": end_date}, "payment_status": "paid"}
-            pipeline_sales = [{"$match": match_criteria}, {"$group": {"_id": None, "total_sales": {"$sum": "$total_amount"}, "count": {"$sum": 1}}}]
-            sales_result = list(db_instance.bills.aggregate(pipeline_sales))
+            sales_result = list(db_instance.bills.aggregate(sales_summary_pipeline(start_date, end_date)))
             sales_data = sales_result[0] if sales_result else {"total_sales": 0, "count": 0}
             report_data["total_sales"] = sales_data.get('total_sales', 0); report_data["bill_count"] = sales_data.get('count', 0)
-            pipeline_top_items = [{"$match": match_criteria}, {"$unwind": "$items"}, {"$match": {"items.status": {"$ne": "cancelled"}}}, {"$group": {"_id": "$items.name", "total_quantity": {"$sum": "$items.quantity"}}}, {"$sort": {"total_quantity": -1}}, {"$limit": 5}]
-            report_data["top_selling_items"] = list(db_instance.bills.aggregate(pipeline_top_items))
+            report_data["top_selling_items"] = list(db_instance.bills.aggregate(top_items_pipeline(start_date, end_date)))
         elif db_instance is None:
              flash("Database connection error.", "danger"); db_error_flag = True
 
@@ -776,6 +1212,181 @@ def reports():
     )
 
 
+# --- Background Jobs ---
+scheduler = JobScheduler(get_db, tick_seconds=config.SCHEDULER_TICK_SECONDS)
+
+
+@scheduler.job('warm_caches', interval_seconds=3600, run_at_startup=True, per_process=True)
+def job_warm_caches(db_instance):
+    """Builds this worker's in-memory menu search index before the first request needs it."""
+    return {"menu_items_indexed": menu_index.rebuild(db_instance)}
+
+
+@scheduler.job('recompute_order_totals', interval_seconds=300)
+def job_recompute_order_totals(db_instance):
+    """Repairs stored subtotal/tax/total on unbilled orders that drifted from their items."""
+    checked, updates = 0, []
+    for order in db_instance.orders.find({"status": {"$in": ["open", "closed"]}}, {"items": 1, "subtotal": 1, "tax": 1, "total_amount": 1}):
+        checked += 1
+        subtotal, tax, total = calculate_order_total(order.get('items', []))
+        if (round(order.get('subtotal', 0.0), 2), round(order.get('tax', 0.0), 2), round(order.get('total_amount', 0.0), 2)) != (round(subtotal, 2), round(tax, 2), round(total, 2)):
+            # Match on the items we summed so a concurrent add/cancel isn't overwritten
+            updates.append(UpdateOne({"_id": order['_id'], "items": order.get('items', [])}, {"$set": {"subtotal": subtotal, "tax": tax, "total_amount": total}}))
+    if updates: db_instance.orders.bulk_write(updates, ordered=False)
+    return {"checked": checked, "fixed": len(updates)}
+
+
+@scheduler.job('prune_kitchen_tickets', interval_seconds=24 * 3600)
+def job_prune_kitchen_tickets(db_instance):
+    """Deletes kitchen tickets of closed orders older than KITCHEN_TICKET_RETENTION_DAYS."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=config.KITCHEN_TICKET_RETENTION_DAYS)
+    result = db_instance.kitchen_tickets.delete_many({"order_status": {"$ne": "open"}, "updated_at": {"$lt": cutoff}})
+    return {"deleted": result.deleted_count}
+
+
+@scheduler.job('rebuild_sales_series', interval_seconds=6 * 3600)
+def job_rebuild_sales_series(db_instance):
+    """Re-derives recent completed days of the sales time series from bills.
+
+    The first run backfills all history up to now, so bills finalized before the series existed
+    (including earlier today) are counted; the job document then records `backfilled_at`.
+    """
+    now = datetime.now(timezone.utc)
+    today = day_start(now)
+    start = today - timedelta(days=config.SALES_AGGREGATE_REBUILD_DAYS)
+    jobs = db_instance[scheduler.collection_name]
+    if jobs.find_one({"_id": "rebuild_sales_series", "backfilled_at": {"$exists": True}}, {"_id": 1}) is None:
+        first_bill = db_instance.bills.find_one({}, {"billed_at": 1}, sort=[("billed_at", 1)])
+        summary = {"hours": 0, "item_days": 0}
+        if first_bill is not None:
+            # Bills finalizing during the backfill may be miscounted for today; the regular
+            # rebuild corrects today once it is a completed day.
+            summary = rebuild_sales_series(db_instance, min(start, day_start(first_bill['billed_at'])), now)
+        jobs.update_one({"_id": "rebuild_sales_series"}, {"$set": {"backfilled_at": now}}, upsert=True)
+        return {**summary, "backfill": True}
+    return rebuild_sales_series(db_instance, start, today)
+
+
+@scheduler.job('reconcile_status_counters', interval_seconds=600, run_at_startup=True)
+def job_reconcile_status_counters(db_instance):
+    """Corrects drift in the table/order status counters (e.g. after direct DB edits)."""
+    return {"drift": reconcile_status_counters(db_instance)}
+
+
+def start_background_jobs():
+    """Starts the scheduler unless disabled, or this is the debug reloader's parent process.
+    Called by each serving process once it is running (never at import): the __main__ block,
+    create_app() for waitress, gunicorn.conf.py's post_fork hook and the ASGI lifespan."""
+    if not config.SCHEDULER_ENABLED:
+        return
+    if app.config['DEBUG'] and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return  # The reloader parent only watches files; its child serves requests
+    scheduler.start()
+
+
+@app.route('/admin/jobs')
+def admin_jobs():
+    """JSON status (timing, last result, errors) of background maintenance jobs."""
+    try:
+        return jsonify({"success": True, "jobs": scheduler.status()})
+    except Exception as e:
+        print(f"Error fetching job status: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/admin/jobs/run/<name>', methods=['POST'])
+def admin_job_run(name):
+    """Runs a job immediately (still respecting the cross-worker lease)."""
+    if name not in scheduler.jobs: return jsonify({"success": False, "error": "Unknown job."}), 404
+    try:
+        ran = scheduler.run_job(name, force=True)
+        if not ran: return jsonify({"success": False, "error": "Job is running elsewhere or database unavailable."}), 409
+        return jsonify({"success": True, "job": next(j for j in scheduler.status() if j['name'] == name)})
+    except Exception as e:
+        print(f"Error running job {name}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def create_app():
+    """App factory for servers without startup hooks: `waitress-serve --call app:create_app`."""
+    start_background_jobs()
+    return app
+
+
+def parse_date_range_args(default_days):
+    """Reads start_date/end_date (YYYY-MM-DD, end inclusive) from the query string.
+    Returns (start, end_exclusive); defaults to the last `default_days` days including today."""
+    today = day_start(datetime.now(timezone.utc))
+    start_str, end_str = request.args.get('start_date'), request.args.get('end_date')
+    end = (datetime.strptime(end_str, '%Y-%m-%d').replace(tzinfo=timezone.utc) if end_str else today) + timedelta(days=1)
+    start = datetime.strptime(start_str, '%Y-%m-%d').replace(tzinfo=timezone.utc) if start_str else end - timedelta(days=default_days)
+    if end <= start: raise ValueError("End date must be after start date.")
+    return start, end
+
+
+@app.route('/reports/sales_hourly')
+def reports_sales_hourly():
+    """Hourly sales series plus a weekday x hour heatmap, served from sales_hourly."""
+    db_instance = get_analytics_db()
+    if db_instance is None: return jsonify({"success": False, "error": "Database error."}), 500
+    try:
+        start, end = parse_date_range_args(default_days=7)
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid date range: {e}"}), 400
+    try:
+        series = []
+        heatmap = [[0.0] * 24 for _ in range(7)]  # heatmap[weekday (Mon=0)][hour]
+        for doc in db_instance.sales_hourly.find({"_id": {"$gte": start, "$lt": end}}).sort("_id"):
+            series.append({"hour": doc['_id'].isoformat(), "total_sales": round(doc.get('total_sales', 0.0), 2), "bill_count": doc.get('bill_count', 0)})
+            heatmap[doc['_id'].weekday()][doc['_id'].hour] += doc.get('total_sales', 0.0)
+        return jsonify({
+            "success": True, "start": start.isoformat(), "end": end.isoformat(), "series": series,
+            "heatmap": [[round(value, 2) for value in row] for row in heatmap],
+            "total_sales": round(sum(point["total_sales"] for point in series), 2),
+            "bill_count": sum(point["bill_count"] for point in series)
+        })
+    except Exception as e:
+        print(f"Error fetching hourly sales: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/reports/item_trend')
+def reports_item_trend():
+    """Daily quantity/revenue per menu item, e.g. /reports/item_trend?menu_item_id=...&start_date=2024-01-01
+    Without menu_item_id, returns the top `limit` items (by quantity) in the range."""
+    db_instance = get_analytics_db()
+    if db_instance is None: return jsonify({"success": False, "error": "Database error."}), 500
+    try:
+        start, end = parse_date_range_args(default_days=30)
+        limit = max(1, min(int(request.args.get('limit', 5)), 20))
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid parameters: {e}"}), 400
+    try:
+        day_filter = {"day": {"$gte": start, "$lt": end}}
+        menu_item_id = request.args.get('menu_item_id')
+        if menu_item_id:
+            item_keys = [menu_item_id]
+        else:
+            top = db_instance.sales_items_daily.aggregate([
+                {"$match": day_filter},
+                {"$group": {"_id": "$item_key", "quantity": {"$sum": "$quantity"}}},
+                {"$sort": {"quantity": -1}}, {"$limit": limit}
+            ])
+            item_keys = [doc['_id'] for doc in top]
+        items = {}
+        for doc in db_instance.sales_items_daily.find({**day_filter, "item_key": {"$in": item_keys}}).sort("day"):
+            trend = items.setdefault(doc['item_key'], {"item_key": doc['item_key'], "name": doc.get('name'), "quantity": 0, "revenue": 0.0, "series": []})
+            trend["name"] = doc.get('name') or trend["name"]
+            trend["quantity"] += doc.get('quantity', 0)
+            trend["revenue"] = round(trend["revenue"] + doc.get('revenue', 0.0), 2)
+            trend["series"].append({"day": doc['day'].date().isoformat(), "quantity": doc.get('quantity', 0), "revenue": round(doc.get('revenue', 0.0), 2)})
+        return jsonify({"success": True, "start": start.isoformat(), "end": end.isoformat(),
+                        "items": [items[key] for key in item_keys if key in items]})
+    except Exception as e:
+        print(f"Error fetching item trend: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # --- Context Processors ---
 @app.context_processor
 def inject_global_vars():
@@ -795,12 +1406,13 @@ if __name__ == '__main__':
     print("Starting Flask development server...")
     # Set host='0.0.0.0' only if you need external access during development
     # Set threaded=True only for DEVELOPMENT server
+    start_background_jobs()
     app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'], threaded=True)
 
     # Production Deployment Examples (Commented out)
     # from waitress import serve
     # print("Starting Flask production server with Waitress...")
-    # serve(app, host="0.0.0.0", port=5000)
+    # serve(create_app(), host="0.0.0.0", port=5000)
     #
     # Gunicorn command line:
-    # gunicorn --bind 0.0.0.0:5000 app:app -w 4 # Example with 4 workers
\ No newline at end of file
+    # gunicorn --bind 0.0.0.0:5000 app:app -w 4 # Example with 4 workers (gunicorn.conf.py starts the scheduler per worker)
\ No newline at end of file
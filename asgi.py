@@ -0,0 +1,218 @@
+"""Async serving mode (ASGI) for long-lived KDS and dashboard connections.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Read-mostly live views are served by asyncio handlers on an async MongoDB driver (Motor):
+idle kitchen/dashboard screens cost a coroutine and a queue instead of a worker thread, and
+one poller per stream key (station) reads MongoDB no matter how many screens are connected.
+Every other path is handed to the existing Flask app through a WSGI thread pool, so the
+sync routes keep working unchanged.
+"""
+import asyncio
+import contextlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from a2wsgi import WSGIMiddleware
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import errors
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import config
+from app import (ANALYTICS_READ_PREF, KDS_TICKET_PROJECTION, STATUS_COUNTERS_ID,
+                 app as flask_app, kds_item_from_ticket, kds_snapshot_json,
+                 kds_ticket_filter, report_period_bounds, sales_summary_pipeline,
+                 start_background_jobs, top_items_pipeline)
+
+# --- Async Database ---
+motor_client = None
+
+
+def get_async_db(analytics=False):
+    """Primary database handle, or the analytics read preference (see get_analytics_db in app.py)."""
+    if not analytics:
+        return motor_client[config.MONGO_DB_NAME]
+    return motor_client.get_database(config.MONGO_DB_NAME, read_preference=ANALYTICS_READ_PREF)
+
+
+# --- Broadcast Hubs ---
+class BroadcastHub:
+    """Runs one poller per key while it has subscribers and fans each changed snapshot out to them.
+
+    Subscriber queues hold only the latest snapshot, so a slow screen skips intermediate states
+    instead of buffering them.
+    """
+
+    def __init__(self, name, fetch, interval_seconds):
+        self.name = name
+        self.fetch = fetch  # async fetch(key) -> serialized snapshot (str)
+        self.interval_seconds = interval_seconds
+        self._subscribers = {}
+        self._pollers = {}
+        self._latest = {}
+
+    def subscribe(self, key):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(key, set()).add(queue)
+        if key in self._latest:
+            queue.put_nowait(self._latest[key])
+        if key not in self._pollers or self._pollers[key].done():
+            self._pollers[key] = asyncio.create_task(self._poll(key))
+        return queue
+
+    def unsubscribe(self, key, queue):
+        subscribers = self._subscribers.get(key, set())
+        subscribers.discard(queue)
+        if not subscribers:
+            poller = self._pollers.pop(key, None)
+            if poller is not None: poller.cancel()
+            self._subscribers.pop(key, None)
+            self._latest.pop(key, None)
+
+    async def _poll(self, key):
+        while True:
+            try:
+                payload = await self.fetch(key)
+                if payload != self._latest.get(key):
+                    self._latest[key] = payload
+                    for queue in list(self._subscribers.get(key, ())):
+                        if queue.full(): queue.get_nowait()
+                        queue.put_nowait(payload)
+            except errors.PyMongoError as e:
+                print(f"{self.name} stream poll failed for '{key}': {e}")
+            except Exception as e:  # Keep polling: a dead poller would leave its screens on keep-alives forever
+                print(f"{self.name} stream poll error for '{key}' ({type(e).__name__}): {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self):
+        return {"connections": sum(len(subs) for subs in self._subscribers.values()),
+                "pollers": len(self._pollers),
+                "by_key": {str(key): len(subs) for key, subs in self._subscribers.items()}}
+
+
+async def fetch_kds_snapshot(station):
+    cursor = get_async_db().kitchen_tickets.find(kds_ticket_filter(station), KDS_TICKET_PROJECTION).sort("order_time")
+    return kds_snapshot_json([kds_item_from_ticket(ticket) async for ticket in cursor])
+
+
+async def fetch_dashboard_snapshot(_key=None):
+    db_instance, analytics_db = get_async_db(), get_async_db(analytics=True)
+    today_start, today_end, _ = report_period_bounds('today', datetime.now(timezone.utc))
+    counters, sales, preview = await asyncio.gather(
+        db_instance.counters.find_one({"_id": STATUS_COUNTERS_ID}),
+        analytics_db.bills.aggregate(sales_summary_pipeline(today_start, today_end)).to_list(length=1),
+        db_instance.kitchen_tickets.find(kds_ticket_filter(), KDS_TICKET_PROJECTION)
+            .sort([("order_time", 1), ("item_index", 1)]).limit(3).to_list(length=3)
+    )
+    counters = counters or {}
+    sales_data = sales[0] if sales else {}
+    return json.dumps({
+        "tables": {"total": counters.get('tables', {}).get('total', 0), "available": counters.get('tables', {}).get('available', 0)},
+        "orders": {"active": counters.get('orders', {}).get('open', 0), "pending_bills": counters.get('orders', {}).get('closed', 0)},
+        "sales": {"today": sales_data.get('total_sales', 0), "count": sales_data.get('count', 0)},
+        "kds_preview": [kds_item_from_ticket(ticket) for ticket in preview]
+    }, default=str, sort_keys=True)
+
+
+kds_hub = BroadcastHub("KDS", fetch_kds_snapshot, config.KDS_STREAM_POLL_SECONDS)
+dashboard_hub = BroadcastHub("Dashboard", fetch_dashboard_snapshot, config.KDS_STREAM_POLL_SECONDS)
+
+
+def sse_response(hub, key, event):
+    async def events():
+        queue = hub.subscribe(key)
+        try:
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=config.STREAM_HEARTBEAT_SECONDS)
+                    yield f"event: {event}\ndata: {payload}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:  # Client disconnected (the response task is cancelled)
+            hub.unsubscribe(key, queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Async Routes ---
+async def kds_stream(request):
+    station = request.query_params.get('station', '').strip().lower() or None
+    return sse_response(kds_hub, station, 'kds')
+
+
+async def dashboard_stream(request):
+    return sse_response(dashboard_hub, None, 'dashboard')
+
+
+async def api_dashboard(request):
+    try:
+        return JSONResponse({"success": True, **json.loads(await fetch_dashboard_snapshot())})
+    except errors.PyMongoError as e:
+        print(f"Async dashboard query failed: {e}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def api_reports(request):
+    """Same figures as /reports (period=today|yesterday|month|prev_month|year, or start_date/end_date)."""
+    params = request.query_params
+    now = datetime.now(timezone.utc)
+    if params.get('start_date') and params.get('end_date'):
+        try:
+            start = datetime.strptime(params['start_date'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            end = datetime.strptime(params['end_date'], '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+        except ValueError:
+            return JSONResponse({"success": False, "error": "Invalid date format (YYYY-MM-DD)."}, status_code=400)
+        if end <= start:
+            return JSONResponse({"success": False, "error": "End date must be after start date."}, status_code=400)
+        display = "Custom Range"
+    else:
+        bounds = report_period_bounds(params.get('period', 'today'), now)
+        if bounds is None:
+            return JSONResponse({"success": False, "error": f"Invalid period '{params.get('period')}'."}, status_code=400)
+        start, end, display = bounds
+    try:
+        analytics_db = get_async_db(analytics=True)
+        sales, top_items = await asyncio.gather(
+            analytics_db.bills.aggregate(sales_summary_pipeline(start, end)).to_list(length=1),
+            analytics_db.bills.aggregate(top_items_pipeline(start, end)).to_list(length=None)
+        )
+    except errors.PyMongoError as e:
+        print(f"Async report query failed: {e}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    sales_data = sales[0] if sales else {}
+    return JSONResponse({
+        "success": True, "period": display, "start": start.isoformat(), "end": end.isoformat(),
+        "total_sales": sales_data.get('total_sales', 0), "bill_count": sales_data.get('count', 0),
+        "top_selling_items": top_items
+    })
+
+
+async def api_streams(request):
+    """Open stream connections and active pollers (handy when benchmarking capacity)."""
+    return JSONResponse({"kds": kds_hub.stats(), "dashboard": dashboard_hub.stats()})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global motor_client
+    motor_client = AsyncIOMotorClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+    print("Async MongoDB client ready (ASGI mode).")
+    start_background_jobs()
+    yield
+    motor_client.close()
+
+
+application = Starlette(
+    routes=[
+        Route('/kds/stream', kds_stream),
+        Route('/dashboard/stream', dashboard_stream),
+        Route('/api/dashboard', api_dashboard),
+        Route('/api/reports', api_reports),
+        Route('/api/streams', api_streams),
+        # Everything else (pages, forms, writes) is the unchanged Flask app on a thread pool
+        Mount('/', app=WSGIMiddleware(flask_app, workers=config.ASGI_WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
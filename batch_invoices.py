@@ -0,0 +1,173 @@
+"""Batch invoice renderer: reprints/archives every bill in a date range.
+
+Usage:
+    python batch_invoices.py --start 2024-05-01 --end 2024-05-31 --out invoices/
+    python batch_invoices.py --start 2024-05-01 --format pdf --workers 8
+
+Bills are streamed from MongoDB in chunks and rendered in parallel by a process pool
+using templates/invoice_print.html (the printable equivalent of bill_view.html).
+PDF output needs WeasyPrint (`pip install weasyprint`); HTML output has no extra dependencies.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from pymongo import MongoClient, errors
+
+import config
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+TEMPLATE_NAME = 'invoice_print.html'
+BILL_PROJECTION = {
+    "order_id": 1, "table_number": 1, "items": 1, "subtotal": 1, "tax": 1, "tax_rate_percent": 1,
+    "discount": 1, "total_amount": 1, "payment_method": 1, "billed_at": 1
+}
+
+# Per-worker state, set up once by init_worker() rather than for every chunk
+_template = None
+_output_format = 'html'
+
+
+def init_worker(output_format):
+    global _template, _output_format
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(['html']))
+    _template = env.get_template(TEMPLATE_NAME)
+    _output_format = output_format
+    if output_format == 'pdf':
+        import weasyprint  # noqa: F401  (fail fast in the worker if it's missing)
+
+
+def invoice_filename(bill, output_format):
+    billed_at = bill.get('billed_at')
+    stamp = billed_at.strftime('%Y%m%d-%H%M%S') if billed_at else 'unknown'
+    return f"invoice_{stamp}_{bill['_id']}.{output_format}"
+
+
+def render_chunk(bills, out_dir):
+    """Renders one chunk of bills to files. Returns (rendered_count, bytes_written, errors)."""
+    rendered, written, failures = 0, 0, []
+    for bill in bills:
+        try:
+            html = _template.render(bill=bill, tax_rate=config.TAX_RATE_PERCENT)
+            path = os.path.join(out_dir, invoice_filename(bill, _output_format))
+            if _output_format == 'pdf':
+                import weasyprint
+                data = weasyprint.HTML(string=html, base_url=TEMPLATE_DIR).write_pdf()
+            else:
+                data = html.encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(data)
+            rendered += 1
+            written += len(data)
+        except Exception as e:
+            failures.append(f"{bill.get('_id')}: {e}")
+    return rendered, written, failures
+
+
+def stream_chunks(cursor, chunk_size):
+    chunk = []
+    for bill in cursor:
+        chunk.append(bill)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def print_progress(done, total, started, bytes_written):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    percent = (done / total * 100) if total else 100.0
+    print(f"\r  {done}/{total} bills ({percent:5.1f}%) | {done / elapsed:7.1f} bills/s | "
+          f"{bytes_written / 1024 / 1024:6.1f} MB | {elapsed:6.1f}s", end='', flush=True)
+
+
+def render_invoices(db_instance, start, end, out_dir, output_format='html', workers=None, chunk_size=50):
+    """Renders every paid bill with start <= billed_at < end. Returns a summary dict."""
+    os.makedirs(out_dir, exist_ok=True)
+    bill_filter = {"billed_at": {"$gte": start, "$lt": end}, "payment_status": "paid"}
+    total = db_instance.bills.count_documents(bill_filter)
+    workers = workers or os.cpu_count() or 1
+    print(f"Rendering {total} bills ({start:%Y-%m-%d} to {(end - timedelta(days=1)):%Y-%m-%d}) "
+          f"as {output_format.upper()} with {workers} workers -> {out_dir}")
+
+    started = time.monotonic()
+    done, bytes_written, failures = 0, 0, []
+    cursor = db_instance.bills.find(bill_filter, BILL_PROJECTION, batch_size=chunk_size * 2).sort("billed_at")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(output_format,)) as pool:
+        pending = set()
+        for chunk in stream_chunks(cursor, chunk_size):
+            pending.add(pool.submit(render_chunk, chunk, out_dir))
+            # Keep a bounded number of chunks in flight so memory stays flat on large ranges
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rendered, written, chunk_failures = future.result()
+                    done, bytes_written = done + rendered + len(chunk_failures), bytes_written + written
+                    failures.extend(chunk_failures)
+                print_progress(done, total, started, bytes_written)
+        for future in pending:
+            rendered, written, chunk_failures = future.result()
+            done, bytes_written = done + rendered + len(chunk_failures), bytes_written + written
+            failures.extend(chunk_failures)
+            print_progress(done, total, started, bytes_written)
+    print()
+
+    elapsed = time.monotonic() - started
+    summary = {
+        "total": total, "rendered": done - len(failures), "failed": len(failures), "seconds": round(elapsed, 2),
+        "bills_per_second": round(done / elapsed, 1) if elapsed else 0.0, "bytes_written": bytes_written
+    }
+    print(f"Done: {summary['rendered']} rendered, {summary['failed']} failed in {summary['seconds']}s "
+          f"({summary['bills_per_second']} bills/s).")
+    for failure in failures[:20]:
+        print(f"  Failed: {failure}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render invoices for all bills in a date range.")
+    parser.add_argument('--start', required=True, help="First billing day (YYYY-MM-DD, UTC)")
+    parser.add_argument('--end', help="Last billing day, inclusive (YYYY-MM-DD, UTC). Defaults to --start.")
+    parser.add_argument('--out', default='invoices', help="Output directory (default: invoices/)")
+    parser.add_argument('--format', choices=['html', 'pdf'], default='html', dest='output_format')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=50, help="Bills per worker task (default: 50)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        start = datetime.strptime(args.start, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        end = datetime.strptime(args.end or args.start, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+    except ValueError:
+        print("Invalid date format (YYYY-MM-DD).", file=sys.stderr)
+        return 2
+    if end <= start:
+        print("End date must not be before start date.", file=sys.stderr)
+        return 2
+    if args.output_format == 'pdf':
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            print("PDF output requires WeasyPrint: pip install weasyprint", file=sys.stderr)
+            return 2
+
+    try:
+        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command('ping')
+    except errors.PyMongoError as e:
+        print(f"MongoDB connection failed: {e}", file=sys.stderr)
+        return 1
+    summary = render_invoices(client[config.MONGO_DB_NAME], start, end, args.out, args.output_format,
+                              args.workers, max(1, args.chunk_size))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
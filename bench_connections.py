@@ -0,0 +1,155 @@
+"""Connection-capacity benchmark for live KDS/dashboard screens (stdlib only).
+
+Simulates N always-on KDS screens against a running server for a while, and meanwhile
+times ordinary page requests to see whether the server still answers. Each serving mode
+is benchmarked the way its screens actually connect:
+
+    # WSGI server: screens short-poll the queue snapshot
+    waitress-serve --threads 16 --port 5000 --call app:create_app
+    python bench_connections.py --port 5000 --connections 200 --stream-path /kds/snapshot --poll-interval 2
+
+    # ASGI server: screens hold one server-sent-event stream each
+    uvicorn asgi:application --port 5001
+    python bench_connections.py --port 5001 --connections 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+
+async def open_stream(host, port, path, connect_timeout):
+    """Opens one SSE connection; returns (reader, writer) once response headers arrive, else None."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), connect_timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), connect_timeout)
+        if b" 200 " not in status_line:
+            writer.close()
+            return None
+        return reader, writer
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def drain_stream(reader, stop):
+    """Keeps reading so the server's writes never block; stops when `stop` is set or EOF."""
+    while not stop.is_set():
+        try:
+            chunk = await asyncio.wait_for(reader.read(4096), 1.0)
+            if not chunk: return False  # Server closed the stream
+        except asyncio.TimeoutError:
+            continue
+        except OSError:
+            return False
+    return True
+
+
+async def probe(host, port, path, timeout):
+    """Times one plain GET request; returns seconds or None on failure/timeout."""
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        status_code = int(status_line.split()[1]) if len(status_line.split()) > 1 else 0
+        return time.monotonic() - started if 200 <= status_code < 400 else None
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def poll_screen(args, stop, latencies):
+    """One short-polling screen: GETs the snapshot every poll_interval until `stop` is set.
+    Returns the number of failed polls."""
+    failures = 0
+    while not stop.is_set():
+        latency = await probe(args.host, args.port, args.stream_path, args.probe_timeout)
+        if latency is None: failures += 1
+        else: latencies.append(latency)
+        try:
+            await asyncio.wait_for(stop.wait(), args.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+    return failures
+
+
+def print_latencies(label, latencies):
+    if latencies:
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"  {label} latency: median {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+
+
+async def hold_and_probe(args):
+    """Times probe requests until the hold period ends. Returns (latencies, failures)."""
+    latencies, failures = [], 0
+    hold_until = time.monotonic() + args.hold
+    while time.monotonic() < hold_until:
+        latency = await probe(args.host, args.port, args.probe_path, args.probe_timeout)
+        if latency is None: failures += 1
+        else: latencies.append(latency)
+        await asyncio.sleep(args.probe_interval)
+    return latencies, failures
+
+
+async def run_polling(args):
+    print(f"Starting {args.connections} screens polling http://{args.host}:{args.port}{args.stream_path} "
+          f"every {args.poll_interval:g}s ...")
+    stop, poll_latencies = asyncio.Event(), []
+    screens = [asyncio.create_task(poll_screen(args, stop, poll_latencies)) for _ in range(args.connections)]
+    latencies, failures = await hold_and_probe(args)
+    stop.set()
+    poll_failures = sum(await asyncio.gather(*screens))
+
+    print(f"  Polls: {len(poll_latencies)} ok, {poll_failures} failed/timed out")
+    print_latencies("Poll", poll_latencies)
+    print(f"  Probe {args.probe_path}: {len(latencies)} ok, {failures} failed/timed out")
+    print_latencies("Probe", latencies)
+
+
+async def run(args):
+    if args.poll_interval:
+        return await run_polling(args)
+    print(f"Opening {args.connections} streams to http://{args.host}:{args.port}{args.stream_path} ...")
+    started = time.monotonic()
+    results = await asyncio.gather(*(
+        open_stream(args.host, args.port, args.stream_path, args.connect_timeout) for _ in range(args.connections)
+    ))
+    streams = [result for result in results if result]
+    print(f"  Connected: {len(streams)}/{args.connections} in {time.monotonic() - started:.2f}s")
+
+    stop = asyncio.Event()
+    drains = [asyncio.create_task(drain_stream(reader, stop)) for reader, _ in streams]
+    latencies, failures = await hold_and_probe(args)
+    stop.set()
+    still_open = sum(1 for alive in await asyncio.gather(*drains) if alive)
+    for _, writer in streams:
+        writer.close()
+
+    print(f"  Streams still open after {args.hold:.0f}s: {still_open}/{len(streams)}")
+    print(f"  Probe {args.probe_path}: {len(latencies)} ok, {failures} failed/timed out")
+    print_latencies("Probe", latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many idle live screens a server can hold.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=200, help="Concurrent screens (idle streams or pollers)")
+    parser.add_argument('--stream-path', default='/kds/stream', help="Stream, or snapshot URL with --poll-interval")
+    parser.add_argument('--poll-interval', type=float, default=0.0,
+                        help="Short-poll --stream-path every N seconds instead of holding streams (WSGI mode)")
+    parser.add_argument('--probe-path', default='/tables', help="Page timed while the streams are held open")
+    parser.add_argument('--hold', type=float, default=30.0, help="Seconds to hold the streams open")
+    parser.add_argument('--probe-interval', type=float, default=1.0)
+    parser.add_argument('--connect-timeout', type=float, default=10.0)
+    parser.add_argument('--probe-timeout', type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
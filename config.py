@@ -12,6 +12,7 @@ MONGO_IP = os.environ.get("MONGO_IP", "127.0.0.1") # Default to localhost if not
 MONGO_PORT = int(os.environ.get("MONGO_PORT", 27017))
 MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "restaurant_db")
 MONGO_AUTH_DB = os.environ.get("MONGO_AUTH_DB", "admin") # DB for authentication
+MONGO_REPLICA_SET = os.environ.get("MONGO_REPLICA_SET", "") # e.g. rs0; leave empty for a standalone server
 
 # --- Encode username and password ---
 # This handles special characters like '@', ':', '/' etc. in credentials
@@ -21,6 +22,16 @@ encoded_password = urllib.parse.quote_plus(MONGO_PASSWORD)
 # --- Construct the MongoDB URI ---
 # Use the encoded username and password
 MONGO_URI = f"mongodb://{encoded_username}:{encoded_password}@{MONGO_IP}:{MONGO_PORT}/?authSource={MONGO_AUTH_DB}"
+if MONGO_REPLICA_SET:
+    MONGO_URI += f"&replicaSet={urllib.parse.quote_plus(MONGO_REPLICA_SET)}"
+
+# --- Read Preferences (per route class) ---
+# Analytics (dashboard sales, reports) can be served from secondaries so they don't compete
+# with order writes. Orders, KDS and billing always read from the primary.
+# Modes: primary, primaryPreferred, secondary, secondaryPreferred, nearest
+ANALYTICS_READ_PREFERENCE = os.environ.get("ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+# Max replication lag tolerated for analytics reads. MongoDB requires at least 90 seconds; -1 disables the bound.
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get("ANALYTICS_MAX_STALENESS_SECONDS", 90))
 
 
 # --- Flask Configuration ---
@@ -31,6 +42,32 @@ DEBUG = FLASK_ENV == 'development'
 
 # --- Application Specific ---
 TAX_RATE_PERCENT = float(os.environ.get("TAX_RATE_PERCENT", 5.0)) # Example Tax Rate
+MENU_SEARCH_INDEX_TTL_SECONDS = int(os.environ.get("MENU_SEARCH_INDEX_TTL_SECONDS", 60)) # Rebuild in-memory menu search index at least this often (0 = only on menu edits)
+
+# --- Background Jobs ---
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_TICK_SECONDS = int(os.environ.get("SCHEDULER_TICK_SECONDS", 5)) # How often each worker checks for due jobs
+KITCHEN_TICKET_RETENTION_DAYS = int(os.environ.get("KITCHEN_TICKET_RETENTION_DAYS", 7)) # Prune tickets of closed orders after this
+SALES_AGGREGATE_REBUILD_DAYS = int(os.environ.get("SALES_AGGREGATE_REBUILD_DAYS", 2)) # Completed days of sales time series re-derived from bills on each rebuild
+
+# --- Live Screens (KDS/dashboard streams) ---
+KDS_STREAM_POLL_SECONDS = float(os.environ.get("KDS_STREAM_POLL_SECONDS", 2)) # How often stream pollers re-read the queue
+STREAM_HEARTBEAT_SECONDS = int(os.environ.get("STREAM_HEARTBEAT_SECONDS", 15)) # Keep-alive comments so proxies don't drop idle streams
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 10)) # Threads serving the sync Flask routes in ASGI mode (asgi.py)
+
+# --- Kitchen Display Stations ---
+# Maps menu categories to KDS stations, e.g. "Drinks=bar,Beverages=bar,Desserts=desserts,Grill=grill"
+# Categories not listed go to KDS_DEFAULT_STATION.
+KDS_DEFAULT_STATION = os.environ.get("KDS_DEFAULT_STATION", "kitchen")
+KDS_STATION_MAP = {
+    category.strip().lower(): station.strip().lower()
+    for category, _, station in (
+        pair.partition("=") for pair in os.environ.get(
+            "KDS_STATION_MAP", "Drinks=bar,Beverages=bar,Desserts=desserts,Grill=grill"
+        ).split(",")
+    )
+    if category.strip() and station.strip()
+}
 
 
 # --- Optional: Print loaded config values during startup (for debugging) ---
@@ -44,8 +81,11 @@ if DEBUG: # Only print in debug mode
     print(f"MONGO_USERNAME (Original): {MONGO_USERNAME}")
     # Avoid printing password directly: print(f"MONGO_PASSWORD: {'*' * len(MONGO_PASSWORD) if MONGO_PASSWORD else 'Not Set'}")
     # Print the final URI with password masked
+    print(f"MONGO_REPLICA_SET: {MONGO_REPLICA_SET or 'Not Set'}")
     print(f"MONGO_URI: mongodb://{encoded_username}:******@{MONGO_IP}:{MONGO_PORT}/?authSource={MONGO_AUTH_DB}")
+    print(f"ANALYTICS_READ_PREFERENCE: {ANALYTICS_READ_PREFERENCE} (max staleness {ANALYTICS_MAX_STALENESS_SECONDS}s)")
     print(f"TAX_RATE_PERCENT: {TAX_RATE_PERCENT}")
+    print(f"KDS_STATION_MAP: {KDS_STATION_MAP} (default: {KDS_DEFAULT_STATION})")
     print("--------------------------\n")
 elif os.environ.get('PRINT_CONFIG_ON_START') == 'true': # Or use another flag for production but be careful
     # Optionally print non-sensitive info on production start if needed
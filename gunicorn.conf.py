@@ -0,0 +1,8 @@
+# Gunicorn settings, loaded automatically when gunicorn is started from this directory.
+
+
+def post_fork(server, worker):
+    """Starts the background scheduler inside each worker (threads don't survive the fork,
+    so starting it in the master under --preload would leave workers without one)."""
+    from app import start_background_jobs
+    start_background_jobs()
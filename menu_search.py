@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+
+# Scores used to rank matches (higher is better)
+SCORE_EXACT_NAME = 100
+SCORE_NAME_PREFIX = 80
+SCORE_NAME_WORD_PREFIX = 60
+SCORE_CATEGORY_PREFIX = 40
+SCORE_TRIGRAM_MAX = 30
+
+MIN_TRIGRAM_SIMILARITY = 0.5  # Fraction of query trigrams that must appear in the item name
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text):
+    """Lowercases and collapses whitespace so lookups are case-insensitive."""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def trigrams(text):
+    """Returns the set of character trigrams for a normalized string (padded at word edges)."""
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class MenuSearchIndex:
+    """In-memory prefix + trigram index over menu items for type-ahead lookups.
+
+    The index is rebuilt from MongoDB lazily: on first use, after invalidate() is called
+    by a menu write, or once ttl_seconds have passed (so other worker processes converge).
+    Lookups never touch the database.
+    """
+
+    def __init__(self, ttl_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._items = {}        # item_id (str) -> item summary dict
+        self._prefixes = {}     # word prefix -> set of item_ids
+        self._trigrams = {}     # trigram -> set of item_ids
+        self._built_at = None
+        self._dirty = True
+        self._generation = 0    # Bumped by every invalidate()
+
+    def invalidate(self):
+        """Marks the index stale; the next search rebuilds it."""
+        with self._lock:
+            self._generation += 1
+            self._dirty = True
+
+    def is_stale(self):
+        if self._dirty or self._built_at is None:
+            return True
+        return self.ttl_seconds > 0 and (time.monotonic() - self._built_at) > self.ttl_seconds
+
+    def rebuild(self, db_instance):
+        """Loads menu items (projected to the fields we index) and swaps in fresh lookup tables.
+        The index stays dirty if a menu write invalidated it while the cursor was being read."""
+        with self._lock:
+            started_generation = self._generation
+        cursor = db_instance.menu_items.find(
+            {}, {"_id": 1, "name": 1, "category": 1, "price": 1, "is_available": 1}
+        )
+        items, prefixes, grams = {}, {}, {}
+        for doc in cursor:
+            item_id = str(doc["_id"])
+            name_norm = normalize(doc.get("name"))
+            category_norm = normalize(doc.get("category"))
+            items[item_id] = {
+                "_id": item_id, "name": doc.get("name", ""), "category": doc.get("category") or "",
+                "price": doc.get("price", 0.0), "is_available": bool(doc.get("is_available")),
+                "_name_norm": name_norm, "_category_norm": category_norm,
+                "_name_words": name_norm.split(), "_category_words": category_norm.split(),
+                "_trigrams": trigrams(name_norm)
+            }
+            for word in name_norm.split() + category_norm.split():
+                for end in range(1, len(word) + 1):
+                    prefixes.setdefault(word[:end], set()).add(item_id)
+            for gram in items[item_id]["_trigrams"]:
+                grams.setdefault(gram, set()).add(item_id)
+
+        with self._lock:
+            self._items, self._prefixes, self._trigrams = items, prefixes, grams
+            self._built_at = time.monotonic()
+            self._dirty = self._generation != started_generation
+        return len(items)
+
+    def ensure_fresh(self, db_instance):
+        if self.is_stale() and db_instance is not None:
+            self.rebuild(db_instance)
+
+    def _score(self, item, query_norm, query_words, query_grams):
+        name_norm = item["_name_norm"]
+        if name_norm == query_norm:
+            return SCORE_EXACT_NAME
+        if name_norm.startswith(query_norm):
+            return SCORE_NAME_PREFIX
+        item_words = item["_name_words"]
+        if all(any(w.startswith(q) for w in item_words) for q in query_words):
+            return SCORE_NAME_WORD_PREFIX
+        all_words = item_words + item["_category_words"]
+        if all(any(w.startswith(q) for w in all_words) for q in query_words):
+            return SCORE_CATEGORY_PREFIX
+        if query_grams:
+            similarity = len(query_grams & item["_trigrams"]) / len(query_grams)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                return SCORE_TRIGRAM_MAX * similarity
+        return 0
+
+    def search(self, query, limit=10, available_only=False):
+        """Returns up to `limit` ranked item summaries matching `query`.
+
+        Every query word must prefix-match a word in the item name or category; when that
+        yields fewer than `limit` items, queries of three or more characters also match by
+        trigram similarity (infix/typo tolerant).
+        """
+        query_norm = normalize(query)
+        if not query_norm:
+            return []
+        query_words = query_norm.split()
+        # Trigrams without word padding, so "urge" still matches inside "burger"
+        query_grams = {g for g in trigrams(query_norm) if " " not in g}
+
+        with self._lock:
+            items, prefixes, grams = self._items, self._prefixes, self._trigrams
+
+        # Candidates: intersection of prefix postings for each word; fall back to trigram
+        # hits only when prefixes alone can't fill the result list
+        candidates = None
+        for word in query_words:
+            postings = prefixes.get(word, set())
+            candidates = postings if candidates is None else candidates & postings
+        candidates = set(candidates or ())
+        if len(candidates) < limit:
+            for gram in query_grams:
+                candidates |= grams.get(gram, set())
+
+        scored = []
+        for item_id in candidates:
+            item = items[item_id]
+            if available_only and not item["is_available"]:
+                continue
+            score = self._score(item, query_norm, query_words, query_grams)
+            if score > 0:
+                scored.append((score, item))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]["name"].lower()))
+        results = []
+        for score, item in scored[:limit]:
+            result = {k: v for k, v in item.items() if not k.startswith("_") or k == "_id"}
+            result["score"] = round(score, 2)
+            results.append(result)
+        return results
@@ -0,0 +1,169 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import errors
+
+
+class Job:
+    """A periodic maintenance task. `func(db_instance)` may return a short summary (str/dict)."""
+
+    def __init__(self, name, func, interval_seconds, run_at_startup=False, lease_seconds=None, per_process=False):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.run_at_startup = run_at_startup
+        # How long a worker may hold the job before others assume it died mid-run
+        self.lease_seconds = lease_seconds or max(60, interval_seconds)
+        # Per-process jobs (e.g. warming in-memory caches) run in every worker without a lease
+        self.per_process = per_process
+        self.local_status = {}
+        self.next_local_run = 0.0
+
+
+class JobScheduler:
+    """Lightweight in-process scheduler for maintenance work outside the request path.
+
+    Each process (gunicorn worker, dev server) runs its own daemon thread, but every run is
+    coordinated through a lease document in the `scheduled_jobs` collection, so only one
+    worker executes a given job per interval. The same document records timing and the
+    last-run status, which makes it visible from any worker. Jobs registered with
+    per_process=True skip the lease and keep their status in memory.
+    """
+
+    def __init__(self, get_db, tick_seconds=5, collection_name='scheduled_jobs'):
+        self.get_db = get_db
+        self.tick_seconds = tick_seconds
+        self.collection_name = collection_name
+        self.jobs = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, name, func, interval_seconds, run_at_startup=False, lease_seconds=None, per_process=False):
+        self.jobs[name] = Job(name, func, interval_seconds, run_at_startup, lease_seconds, per_process)
+        return self.jobs[name]
+
+    def job(self, name, interval_seconds, **kwargs):
+        """Decorator form of register()."""
+        def decorator(func):
+            self.register(name, func, interval_seconds, **kwargs)
+            return func
+        return decorator
+
+    # --- Lease Handling ---
+    def _acquire(self, db_instance, job, force=False):
+        """Claims the job if it is due (or forced) and not leased by a live worker."""
+        now = datetime.now(timezone.utc)
+        claim = {"$or": [{"locked_until": {"$lte": now}}, {"locked_until": {"$exists": False}}]}
+        if not force:
+            claim = {"$and": [claim, {"$or": [{"next_run_at": {"$lte": now}}, {"next_run_at": {"$exists": False}}]}]}
+        try:
+            db_instance[self.collection_name].update_one(
+                {"_id": job.name, **claim},
+                {"$set": {"locked_until": now + timedelta(seconds=job.lease_seconds), "locked_by": self.worker_id,
+                          "interval_seconds": job.interval_seconds, "last_started_at": now}},
+                upsert=True
+            )
+            return True
+        except errors.DuplicateKeyError:
+            return False  # Document exists but the claim filter didn't match: not due, or held elsewhere
+
+    def _release(self, db_instance, job, status, duration_ms, summary=None, error=None):
+        now = datetime.now(timezone.utc)
+        db_instance[self.collection_name].update_one(
+            {"_id": job.name, "locked_by": self.worker_id},
+            {"$set": {"locked_until": now, "next_run_at": now + timedelta(seconds=job.interval_seconds),
+                      "last_finished_at": now, "last_status": status, "last_duration_ms": round(duration_ms, 1),
+                      "last_summary": summary, "last_error": error, "last_worker": self.worker_id},
+             "$inc": {"run_count": 1, "error_count": 1 if status == 'error' else 0}}
+        )
+
+    # --- Execution ---
+    def _run_local(self, job, db_instance, force):
+        if not force and time.monotonic() < job.next_local_run:
+            return False
+        started = time.monotonic()
+        try:
+            summary = job.func(db_instance)
+            status, error = 'ok', None
+        except Exception as e:
+            print(f"Job '{job.name}' failed: {e}")
+            summary, status, error = None, 'error', str(e)
+        job.next_local_run = time.monotonic() + job.interval_seconds
+        job.local_status = {
+            "last_finished_at": datetime.now(timezone.utc), "last_status": status, "last_summary": summary,
+            "last_error": error, "last_duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "run_count": job.local_status.get("run_count", 0) + 1, "last_worker": self.worker_id
+        }
+        return True
+
+    def run_job(self, name, force=False):
+        """Runs one job now if this worker can claim it. Returns True if it ran."""
+        job = self.jobs[name]
+        db_instance = self.get_db()
+        if db_instance is None:
+            return False
+        if job.per_process:
+            return self._run_local(job, db_instance, force)
+        if not self._acquire(db_instance, job, force=force):
+            return False
+        started = time.monotonic()
+        try:
+            summary = job.func(db_instance)
+            self._release(db_instance, job, 'ok', (time.monotonic() - started) * 1000, summary=summary)
+            print(f"Job '{name}' finished in {(time.monotonic() - started):.2f}s: {summary}")
+        except Exception as e:
+            print(f"Job '{name}' failed: {e}")
+            try:
+                self._release(db_instance, job, 'error', (time.monotonic() - started) * 1000, error=str(e))
+            except errors.PyMongoError as release_error:
+                print(f"Job '{name}' could not record failure (lease will expire): {release_error}")
+        return True
+
+    def run_pending(self):
+        for name in list(self.jobs):
+            try:
+                self.run_job(name)
+            except errors.PyMongoError as e:
+                print(f"Scheduler could not check job '{name}': {e}")
+
+    def _loop(self):
+        for job in self.jobs.values():
+            if job.run_at_startup:
+                try:
+                    self.run_job(job.name, force=True)
+                except errors.PyMongoError as e:
+                    print(f"Startup job '{job.name}' skipped: {e}")
+        while not self._stop.wait(self.tick_seconds):
+            self.run_pending()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"  # This process, if created before a fork
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+        print(f"Background scheduler started ({len(self.jobs)} jobs, worker {self.worker_id}).")
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        """Timing and last-run status of every registered job (shared across workers)."""
+        db_instance = self.get_db()
+        records = {}
+        shared_names = [job.name for job in self.jobs.values() if not job.per_process]
+        if db_instance is not None and shared_names:
+            records = {doc['_id']: doc for doc in db_instance[self.collection_name].find({"_id": {"$in": shared_names}})}
+        statuses = []
+        for job in self.jobs.values():
+            record = job.local_status if job.per_process else records.get(job.name, {})
+            status = {"name": job.name, "interval_seconds": job.interval_seconds,
+                      "run_at_startup": job.run_at_startup, "per_process": job.per_process}
+            status.update({k: v for k, v in record.items() if k != '_id'})
+            statuses.append(status)
+        return statuses